@@ -1,4 +1,5 @@
-from typing import List
+from functools import cached_property
+from typing import Tuple
 
 from pydantic_settings import BaseSettings
 
@@ -13,6 +14,8 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = ""
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # 1 hour (matches Google's token expiration)
+    JWT_CACHE_TTL: int = 30  # seconds to cache verified token payloads/users
+    JWT_CACHE_SIZE: int = 10000  # max cached tokens
 
     # Google OAuth
     GOOGLE_CLIENT_ID: str = ""
@@ -31,9 +34,9 @@ class Settings(BaseSettings):
     # Storage
     SUPABASE_STORAGE_BUCKET_IMAGES: str = "user-images"
 
-    @property
-    def origins(self) -> List[str]:
-        return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
+    @cached_property
+    def origins(self) -> Tuple[str, ...]:
+        return tuple(origin.strip() for origin in self.ALLOWED_ORIGINS.split(","))
 
     class Config:
         env_file = ".env"
@@ -3,16 +3,19 @@ from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from config.settings import settings
 
 # Import routers
 from src.auth import router as auth_router
+from src.middleware.auth import get_supabase_client
 from src.middleware.error_handler import general_exception_handler
 from src.notifications import router as notifications_router
 from src.posts import router as posts_router
 from src.spotify import router as spotify_router
 from src.storage import router as storage_router
+from src.storage.routes import warm_image_codecs
 from src.users import router as users_router
 
 
@@ -23,6 +26,10 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting AUX App Backend...")
     print(f"📝 Environment: {settings.ENVIRONMENT}")
     print(f"🔗 API Prefix: {settings.API_V1_PREFIX}")
+    # Create the shared Supabase client once so the first request doesn't pay for it
+    app.state.supabase = get_supabase_client()
+    # Warm PIL's JPEG codecs so the first upload skips the lazy setup cost
+    warm_image_codecs()
     yield
     # Shutdown
     print("👋 Shutting down AUX App Backend...")
@@ -36,6 +43,7 @@ app = FastAPI(
     docs_url=f"{settings.API_V1_PREFIX}/docs",
     redoc_url=f"{settings.API_V1_PREFIX}/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
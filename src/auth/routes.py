@@ -1,6 +1,4 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from google.auth.transport import requests
-from google.oauth2 import id_token
 from pydantic import BaseModel
 from supabase._sync.client import SyncClient as Client
 
@@ -15,6 +13,22 @@ from src.middleware.auth import (
 
 router = APIRouter()
 
+# Shared transport for Google token verification, created lazily so the
+# google.auth/requests import cascade stays off the startup path. Reusing one
+# pooled requests.Session keeps Google's certs cached and avoids a TLS
+# handshake per sign-in.
+_google_request = None
+
+
+def _get_google_request():
+    global _google_request
+    if _google_request is None:
+        import requests as http_requests
+        from google.auth.transport import requests as google_requests
+
+        _google_request = google_requests.Request(session=http_requests.Session())
+    return _google_request
+
 
 class GoogleSignInRequest(BaseModel):
     id_token: str
@@ -36,6 +50,9 @@ async def google_sign_in(
     request: GoogleSignInRequest, supabase: Client = Depends(get_supabase_client)
 ):
     """Authenticate user with Google Sign-In ID token"""
+    # Imported here so the cost is paid on first sign-in, not at startup
+    from google.oauth2 import id_token
+
     try:
         # Log the client ID being used (first/last 4 chars only for security)
         client_id = settings.GOOGLE_CLIENT_ID
@@ -43,7 +60,7 @@ async def google_sign_in(
 
         # Verify Google ID token
         idinfo = id_token.verify_oauth2_token(
-            request.id_token, requests.Request(), settings.GOOGLE_CLIENT_ID
+            request.id_token, _get_google_request(), settings.GOOGLE_CLIENT_ID
         )
 
         print(f"Token verified successfully for user: {idinfo.get('email')}")
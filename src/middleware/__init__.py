@@ -1,11 +1,13 @@
-from .auth import get_current_user, get_optional_current_user, get_supabase_client, create_access_token
+from .auth import get_current_user, get_optional_current_user, get_supabase_client, get_supabase_service_client, create_access_token, invalidate_user_cache
 from .error_handler import http_exception_handler, validation_exception_handler, general_exception_handler
 
 __all__ = [
     "get_current_user",
     "get_optional_current_user",
     "get_supabase_client",
+    "get_supabase_service_client",
     "create_access_token",
+    "invalidate_user_cache",
     "http_exception_handler",
     "validation_exception_handler",
     "general_exception_handler",
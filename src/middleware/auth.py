@@ -1,9 +1,14 @@
+import hashlib
+import threading
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+import jwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
+from jwt.exceptions import PyJWTError as JWTError
+from postgrest.exceptions import APIError
 from supabase._sync.client import SyncClient as Client
 from supabase._sync.client import create_client
 
@@ -12,10 +17,69 @@ from config.settings import settings
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
+# Materialized once at import; encode/decode sit on the request hot path
+_JWT_SECRET = settings.JWT_SECRET_KEY
+_JWT_ALGORITHM = settings.JWT_ALGORITHM
+_JWT_ALGORITHMS = [_JWT_ALGORITHM]
+_JWT_DECODE_OPTIONS = {"require": ["exp", "iat"]}
+
+# Short-lived caches so repeated requests with the same bearer token skip
+# signature verification and the user lookup. Entries never outlive the
+# token itself: hits are re-checked against the payload's "exp" claim.
+_payload_cache: TTLCache = TTLCache(
+    maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL
+)
+_user_cache: TTLCache = TTLCache(
+    maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL
+)
+# Keyed by user id so different tokens for the same user share one row read
+_user_row_cache: TTLCache = TTLCache(maxsize=5000, ttl=15)
+_cache_lock = threading.Lock()
+
+
+def invalidate_user_cache(user_id: str) -> None:
+    """Drop cached rows for a user after their profile changes."""
+    with _cache_lock:
+        _user_row_cache.pop(user_id, None)
+        stale_keys = [
+            key for key, user in _user_cache.items() if user.get("id") == user_id
+        ]
+        for key in stale_keys:
+            _user_cache.pop(key, None)
+
+
+def _token_cache_key(token: str) -> str:
+    """Hash the raw token so it is never stored in memory as plaintext."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Shared Supabase clients. Creating a client per request spins up fresh
+# httpx connection state each time; reusing one lets keep-alive pooling work.
+_client: Optional[Client] = None
+_service_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
 
 def get_supabase_client() -> Client:
-    """Create and return a Supabase client."""
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    """Return the shared Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _client
+
+
+def get_supabase_service_client() -> Client:
+    """Return the shared service-role Supabase client, creating it on first use."""
+    global _service_client
+    if _service_client is None:
+        with _client_lock:
+            if _service_client is None:
+                _service_client = create_client(
+                    settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY
+                )
+    return _service_client
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -28,9 +92,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = now + timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire, "iat": now, "type": "access"})
-    encoded_jwt = jwt.encode(
-        to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM
-    )
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALGORITHM)
     return encoded_jwt
 
 
@@ -42,57 +104,105 @@ def create_refresh_token(data: dict) -> str:
     expire = now + timedelta(days=90)
 
     to_encode.update({"exp": expire, "iat": now, "type": "refresh"})
-    encoded_jwt = jwt.encode(
-        to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM
-    )
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALGORITHM)
     return encoded_jwt
 
 
-def decode_token(token: str) -> dict:
-    """Decode and verify JWT token."""
+def _decode_token_or_none(token: str) -> Optional[dict]:
+    """Verify a token and return its payload, or None if it is invalid."""
+    key = _token_cache_key(token)
+    now = datetime.now(timezone.utc).timestamp()
+
+    with _cache_lock:
+        cached = _payload_cache.get(key)
+    if cached is not None and cached.get("exp", 0) > now:
+        return cached
+
     try:
         payload = jwt.decode(
-            token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
+            token,
+            _JWT_SECRET,
+            algorithms=_JWT_ALGORITHMS,
+            options=_JWT_DECODE_OPTIONS,
         )
-        return payload
-    except JWTError as e:
+    except JWTError:
+        return None
+
+    # Only cache successful verifications, and only while the token is valid
+    if payload.get("exp", 0) > now:
+        with _cache_lock:
+            _payload_cache[key] = payload
+    return payload
+
+
+def decode_token(token: str) -> dict:
+    """Decode and verify JWT token."""
+    payload = _decode_token_or_none(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Could not validate credentials: {str(e)}",
+            detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Security(security),
-    supabase: Client = Depends(get_supabase_client),
-) -> dict:
-    """Get the current authenticated user from JWT token."""
-    token = credentials.credentials
-    payload = decode_token(token)
+def _resolve_user(token: str, supabase: Client) -> Optional[dict]:
+    """Resolve a bearer token to its user row without raising.
+
+    Returning None instead of raising keeps the optional-auth path free of
+    HTTPException construction/unwind on every anonymous request.
+    """
+    payload = _decode_token_or_none(token)
+    if payload is None:
+        return None
 
     user_id = payload.get("sub")
     if user_id is None or not isinstance(user_id, str):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        return None
 
-    # Fetch user from database
-    response = supabase.table("users").select("*").eq("id", user_id).single().execute()
+    cache_key = _token_cache_key(token)
+    with _cache_lock:
+        cached_user = _user_cache.get(cache_key) or _user_row_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
 
-    if not response.data:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
+    # Fetch user from database (.single() raises APIError if the row is
+    # missing). Only that case means "no such user"; transport failures must
+    # propagate as 5xx instead of logging everyone out with a 401.
+    try:
+        response = (
+            supabase.table("users").select("*").eq("id", user_id).single().execute()
         )
+    except APIError:
+        return None
+
+    if not response.data:
+        return None
 
     user_data = response.data
     # Derive spotify_connected from whether spotify_access_token exists
     user_data["spotify_connected"] = bool(user_data.get("spotify_access_token"))
 
+    with _cache_lock:
+        _user_cache[cache_key] = user_data
+        _user_row_cache[user_id] = user_data
+
+    return user_data
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+    supabase: Client = Depends(get_supabase_client),
+) -> dict:
+    """Get the current authenticated user from JWT token."""
+    user_data = _resolve_user(credentials.credentials, supabase)
+    if user_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user_data
 
 
@@ -104,7 +214,4 @@ async def get_optional_current_user(
     if credentials is None:
         return None
 
-    try:
-        return await get_current_user(credentials, supabase)
-    except HTTPException:
-        return None
+    return _resolve_user(credentials.credentials, supabase)
@@ -1,23 +1,25 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import TypeAdapter
 from supabase._sync.client import SyncClient as Client
 
 from src.middleware import get_current_user, get_supabase_client
 
 from .schemas import (
     MarkAsReadRequest,
-    NotificationActor,
     NotificationResponse,
     UnreadCountResponse,
 )
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
+# Validating the whole list in one TypeAdapter pass is markedly faster than
+# constructing NotificationResponse(**row) per row
+_notification_list_adapter = TypeAdapter(List[NotificationResponse])
 
-def enrich_notification_with_actor(
-    notification: dict, supabase: Client
-) -> NotificationResponse:
+
+def enrich_notification_with_actor(notification: dict, supabase: Client) -> dict:
     """Enrich notification with current actor data."""
     actor = None
 
@@ -33,12 +35,12 @@ def enrich_notification_with_actor(
                 .execute()
             )
             if actor_result.data:
-                actor = NotificationActor(**actor_result.data)
+                actor = actor_result.data
         except Exception:
             # If user not found, actor stays None
             pass
 
-    return NotificationResponse(**notification, actor=actor)
+    return {**notification, "actor": actor}
 
 
 @router.get("", response_model=List[NotificationResponse])
@@ -69,7 +71,7 @@ async def get_notifications(
         for notification in result.data
     ]
 
-    return enriched_notifications
+    return _notification_list_adapter.validate_python(enriched_notifications)
 
 
 @router.get("/unread-count", response_model=UnreadCountResponse)
@@ -78,15 +80,13 @@ async def get_unread_count(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Get count of unread notifications."""
-    result = (
-        supabase.table("notifications")
-        .select("id", count="exact")  # type: ignore
-        .eq("user_id", current_user["id"])
-        .eq("is_read", False)
-        .execute()
-    )
+    # The unread_count function (migration 012) returns just the number, so
+    # no notification rows are transferred. Don't switch this to a head=True
+    # count: the pinned postgrest client (0.18.x) always reports count=0 on
+    # bodyless responses.
+    result = supabase.rpc("unread_count", {"uid": current_user["id"]}).execute()
 
-    return UnreadCountResponse(unread_count=result.count or 0)
+    return UnreadCountResponse(unread_count=result.data or 0)
 
 
 @router.post("/mark-as-read", status_code=status.HTTP_204_NO_CONTENT)
@@ -96,7 +96,10 @@ async def mark_notifications_as_read(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Mark multiple notifications as read."""
-    # Update notifications
+    # Keep return=representation here: the pinned postgrest client (0.18.x)
+    # never parses the count on a minimal response, so result.count would
+    # always be 0 and the matched check below would 404 after a successful
+    # update
     result = (
         supabase.table("notifications")
         .update({"is_read": True})
@@ -120,9 +123,9 @@ async def mark_all_notifications_as_read(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Mark all notifications as read for the current user."""
-    supabase.table("notifications").update({"is_read": True}).eq(
-        "user_id", current_user["id"]
-    ).eq("is_read", False).execute()
+    supabase.table("notifications").update(
+        {"is_read": True}, returning="minimal"  # type: ignore
+    ).eq("user_id", current_user["id"]).eq("is_read", False).execute()
 
     return None
 
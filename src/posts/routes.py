@@ -1,6 +1,8 @@
+import asyncio
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from supabase._sync.client import SyncClient as Client
 
@@ -22,16 +24,26 @@ class ExpirationCheckResponse(BaseModel):
     message: str
 
 
-def format_post_with_user(post: dict, supabase: Client) -> PostResponse:
+# Embeds the author row via PostgREST so post queries need a single round-trip
+POST_WITH_USER_SELECT = (
+    "*, user:users!posts_user_id_fkey(id, username, display_name, profile_image_url)"
+)
+
+
+async def format_post_with_user(post: dict, supabase: Client) -> PostResponse:
     """Format post data with user info."""
-    # Get user info
-    user = (
-        supabase.table("users")
-        .select("id, username, display_name, profile_image_url")
-        .eq("id", post["user_id"])
-        .single()
-        .execute()
-    )
+    # Use the embedded author when the query joined it; fall back to a fetch
+    # run off the event loop so concurrent posts resolve in parallel
+    user_data = post.get("user")
+    if user_data is None:
+        user = await run_in_threadpool(
+            lambda: supabase.table("users")
+            .select("id, username, display_name, profile_image_url")
+            .eq("id", post["user_id"])
+            .single()
+            .execute()
+        )
+        user_data = user.data
 
     # Map database column names to response field names
     formatted_post = {
@@ -44,10 +56,35 @@ def format_post_with_user(post: dict, supabase: Client) -> PostResponse:
         "caption": post.get("caption"),
         "created_at": post["created_at"],
         "updated_at": post["updated_at"],
-        "user": PostAuthor(**user.data),
+        "user": PostAuthor.model_construct(**user_data),
     }
 
-    return PostResponse(**formatted_post)
+    # Rows come from our own database, so skip re-validation; FastAPI still
+    # validates against the response_model on the way out
+    return PostResponse.model_construct(**formatted_post)
+
+
+async def format_posts_with_users(posts: List[dict], supabase: Client) -> List[PostResponse]:
+    """Format a page of posts, fetching each missing author at most once."""
+    # With the embedded-author select nothing is missing; otherwise one
+    # batched query covers every unique author in the page
+    missing_ids = {post["user_id"] for post in posts if post.get("user") is None}
+    if missing_ids:
+        users = await run_in_threadpool(
+            lambda: supabase.table("users")
+            .select("id, username, display_name, profile_image_url")
+            .in_("id", list(missing_ids))
+            .execute()
+        )
+        users_by_id = {user["id"]: user for user in users.data}
+        for post in posts:
+            if post.get("user") is None:
+                post["user"] = users_by_id.get(post["user_id"])
+
+    formatted_posts = await asyncio.gather(
+        *(format_post_with_user(post, supabase) for post in posts)
+    )
+    return list(formatted_posts)
 
 
 @router.post("", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
@@ -76,7 +113,14 @@ async def create_post(
         )
 
     post = result.data[0]
-    return format_post_with_user(post, supabase)
+    # The author is the current user - no need for another round-trip
+    post["user"] = {
+        "id": current_user["id"],
+        "username": current_user["username"],
+        "display_name": current_user["display_name"],
+        "profile_image_url": current_user.get("profile_image_url"),
+    }
+    return await format_post_with_user(post, supabase)
 
 
 @router.get("/feed", response_model=List[PostResponse])
@@ -90,46 +134,32 @@ async def get_feed(
     Get personalized feed.
     If authenticated, shows posts from followed users + own posts.
     If not authenticated, shows recent posts.
+
+    The is_expired/created_at predicates are backed by the partial indexes
+    in migration 006, so both branches run as index scans.
     """
     current_user_id = current_user["id"] if current_user else None
 
     if current_user_id:
-        # Get following IDs
-        following = (
-            supabase.table("follows")
-            .select("following_id")
-            .eq("follower_id", current_user_id)
-            .execute()
-        )
-
-        following_ids = [f["following_id"] for f in following.data]
-        following_ids.append(current_user_id)  # Include own posts
-
-        # Get posts from followed users (exclude expired)
-        posts = (
-            supabase.table("posts")
-            .select("*")
-            .in_("user_id", following_ids)
-            .eq("is_expired", False)
-            .order("created_at", desc=True)
-            .range(offset, offset + limit - 1)
-            .execute()
-        )
+        # One round-trip: the get_feed function resolves the follow graph,
+        # filters expired posts and joins the author inside Postgres
+        posts = supabase.rpc(
+            "get_feed",
+            {"uid": current_user_id, "lim": limit, "off": offset},
+        ).execute()
     else:
         # Get recent posts (exclude expired)
         posts = (
             supabase.table("posts")
-            .select("*")
+            .select(POST_WITH_USER_SELECT)
             .eq("is_expired", False)
             .order("created_at", desc=True)
             .range(offset, offset + limit - 1)
             .execute()
         )
 
-    # Format posts with user info
-    formatted_posts = [format_post_with_user(post, supabase) for post in posts.data]
-
-    return formatted_posts
+    # Format posts with user info, deduping author lookups across the page
+    return await format_posts_with_users(posts.data, supabase)
 
 
 @router.get("/{post_id}", response_model=PostResponse)
@@ -141,7 +171,7 @@ async def get_post(
     """Get a specific post by ID."""
     post = (
         supabase.table("posts")
-        .select("*")
+        .select(POST_WITH_USER_SELECT)
         .eq("id", post_id)
         .eq("is_expired", False)
         .single()
@@ -154,7 +184,7 @@ async def get_post(
             detail="Post not found or has expired",
         )
 
-    return format_post_with_user(post.data, supabase)
+    return await format_post_with_user(post.data, supabase)
 
 
 @router.patch("/{post_id}", response_model=PostResponse)
@@ -165,37 +195,30 @@ async def update_post(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Update a post (only caption can be updated)."""
-    # Check if post exists and belongs to user
-    post = (
-        supabase.table("posts")
-        .select("*")
-        .eq("id", post_id)
-        .eq("user_id", current_user["id"])
-        .single()
-        .execute()
-    )
-
-    if not post.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found or you don't have permission to edit it",
-        )
-
-    # Update post
+    # Update with the ownership predicate in one query; zero affected rows
+    # means the post is missing or belongs to someone else
     updated_post = (
         supabase.table("posts")
         .update(update_data.model_dump(exclude_unset=True))
         .eq("id", post_id)
+        .eq("user_id", current_user["id"])
         .execute()
     )
 
     if not updated_post.data:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update post",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found or you don't have permission to edit it",
         )
 
-    return format_post_with_user(updated_post.data[0], supabase)
+    post = updated_post.data[0]
+    post["user"] = {
+        "id": current_user["id"],
+        "username": current_user["username"],
+        "display_name": current_user["display_name"],
+        "profile_image_url": current_user.get("profile_image_url"),
+    }
+    return await format_post_with_user(post, supabase)
 
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -205,25 +228,22 @@ async def delete_post(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Delete a post."""
-    # Check if post exists and belongs to user
-    post = (
+    # Delete with the ownership predicate in one query; zero affected rows
+    # means the post is missing or belongs to someone else
+    deleted = (
         supabase.table("posts")
-        .select("id")
+        .delete()
         .eq("id", post_id)
         .eq("user_id", current_user["id"])
-        .single()
         .execute()
     )
 
-    if not post.data:
+    if not deleted.data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found or you don't have permission to delete it",
         )
 
-    # Delete post
-    supabase.table("posts").delete().eq("id", post_id).execute()
-
     return None
 
 
@@ -249,7 +269,7 @@ async def get_user_posts(
     # Get user's posts (exclude expired)
     posts = (
         supabase.table("posts")
-        .select("*")
+        .select(POST_WITH_USER_SELECT)
         .eq("user_id", user.data["id"])
         .eq("is_expired", False)
         .order("created_at", desc=True)
@@ -257,7 +277,5 @@ async def get_user_posts(
         .execute()
     )
 
-    # Format posts with user info
-    formatted_posts = [format_post_with_user(post, supabase) for post in posts.data]
-
-    return formatted_posts
+    # Format posts with user info, deduping author lookups across the page
+    return await format_posts_with_users(posts.data, supabase)
@@ -1,9 +1,20 @@
+import asyncio
+import functools
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import List, Literal, Optional
 
+import orjson
+import requests
 import spotipy
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import HTMLResponse
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from pydantic import BaseModel
 from spotipy.oauth2 import SpotifyOAuth
 from supabase._sync.client import SyncClient as Client
 
@@ -21,9 +32,126 @@ from .schemas import (
 
 router = APIRouter(prefix="/spotify", tags=["Spotify"])
 
+# Spotify clients keyed by access token so back-to-back calls from the same
+# user reuse one pooled session instead of a fresh TLS handshake. The TTL
+# sits just under Spotify's one-hour token lifetime.
+_SP_CLIENTS: TTLCache = TTLCache(maxsize=1024, ttl=3300)
+_sp_clients_lock = threading.Lock()
 
+class _OrjsonSession(requests.Session):
+    """requests.Session whose responses parse JSON with orjson.
+
+    spotipy calls response.json() on every payload; search and playlist
+    bodies run to tens of KB, where orjson parses 2-3x faster than the
+    stdlib decoder requests uses by default.
+    """
+
+    def send(self, *args, **kwargs):
+        response = super().send(*args, **kwargs)
+        response.json = lambda **_kwargs: orjson.loads(response.content)
+        return response
+
+
+# One pooled session shared by every cached client. spotipy sends the
+# Authorization header per call, so only the transport is shared; the
+# 64-connection pool keeps sockets to api.spotify.com bounded and warm.
+_SPOTIFY_SESSION = _OrjsonSession()
+_SPOTIFY_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=64))
+
+# Per-user response caches for the slow-moving list endpoints. TTLs track how
+# quickly each payload realistically changes; the locks coalesce concurrent
+# misses for the same key so only one Spotify round-trip is in flight.
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=10000, ttl=30)
+_TOP_TRACKS_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+_PLAYLISTS_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=300)
+_response_locks: TTLCache = TTLCache(maxsize=4096, ttl=120)
+
+
+def _response_lock(key) -> asyncio.Lock:
+    lock = _response_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _response_locks[key] = lock
+    return lock
+
+
+# Caps in-flight Spotify calls per user so a burst can't trip Spotify's 429
+# rate limit and push spotipy into retry-with-backoff stalls
+_user_semaphores: TTLCache = TTLCache(maxsize=4096, ttl=3600)
+
+
+def _user_semaphore(user_id: str) -> asyncio.Semaphore:
+    sema = _user_semaphores.get(user_id)
+    if sema is None:
+        sema = asyncio.Semaphore(8)
+        _user_semaphores[user_id] = sema
+    return sema
+
+# Persists refreshed tokens off the request path; one worker keeps the
+# writes ordered per process
+_token_write_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="spotify-token-write"
+)
+
+# Refresh tokens a little early so a request never runs with one that
+# expires mid-flight
+_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def _orjson_default(o):
+    """orjson fallback for Pydantic models.
+
+    Emits __dict__ directly instead of model_dump(), skipping pydantic's
+    per-field serializer loop. Safe here because these models are built
+    with model_construct from primitives, so __dict__ already matches the
+    wire format (no aliases, no custom serializers).
+    """
+    if isinstance(o, BaseModel):
+        return o.__dict__
+    raise TypeError
+
+
+class PydanticORJSONResponse(ORJSONResponse):
+    """Serialize Pydantic models straight to orjson.
+
+    Returning this from a route bypasses FastAPI's jsonable_encoder and
+    response_model re-validation, which dominates CPU on the 50-item list
+    endpoints.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def _etag_response(request: Request, content, max_age: int = 60) -> Response:
+    """Render content with a strong ETag; answer 304 if the client has it.
+
+    Lets the mobile client skip re-downloading slow-moving payloads like
+    playlists and top-tracks on every navigation.
+    """
+    response = PydanticORJSONResponse(content)
+    # RFC 9110 entity-tags are quoted strings; unquoted tags never match in
+    # spec-following caches
+    etag = f'"{hashlib.blake2b(response.body, digest_size=8).hexdigest()}"'
+    if request.headers.get("if-none-match", "").removeprefix("W/") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return response
+
+
+@functools.lru_cache(maxsize=1)
 def get_spotify_oauth() -> SpotifyOAuth:
-    """Get Spotify OAuth handler."""
+    """Get the shared Spotify OAuth handler.
+
+    Cached because /connect, /callback and every token refresh hit this,
+    and each SpotifyOAuth carries its own requests.Session; SpotifyOAuth
+    is thread-safe for token exchange.
+    """
     return SpotifyOAuth(
         client_id=settings.SPOTIFY_CLIENT_ID,
         client_secret=settings.SPOTIFY_CLIENT_SECRET,
@@ -32,6 +160,16 @@ def get_spotify_oauth() -> SpotifyOAuth:
     )
 
 
+@functools.lru_cache(maxsize=1024)
+def _parse_expires_at(value: str) -> datetime:
+    """Parse a stored token-expiry timestamp.
+
+    Memoized because the string only changes when the token is refreshed,
+    but this ran on every Spotify API call.
+    """
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
 def get_user_spotify_client(
     user: dict, supabase: Optional[Client] = None
 ) -> spotipy.Spotify:
@@ -42,13 +180,13 @@ def get_user_spotify_client(
         )
 
     # Check if token is expired
+    now = datetime.now(timezone.utc)
     expires_at = user.get("spotify_token_expires_at")
     if expires_at:
-        expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
+        expires_at = _parse_expires_at(expires_at)
 
         # If token is expired or will expire in the next 5 minutes, refresh it
-        if expires_at <= now + timedelta(minutes=5):
+        if expires_at <= now + _REFRESH_MARGIN:
             if not user.get("spotify_refresh_token"):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,9 +201,7 @@ def get_user_spotify_client(
                 )
 
                 # Update user with new tokens
-                new_expires_at = datetime.now(timezone.utc) + timedelta(
-                    seconds=token_info["expires_in"]
-                )
+                new_expires_at = now + timedelta(seconds=token_info["expires_in"])
 
                 update_data = {
                     "spotify_access_token": token_info["access_token"],
@@ -73,11 +209,24 @@ def get_user_spotify_client(
                     "spotify_token_expires_at": new_expires_at.isoformat(),
                 }
 
-                # Update in database if supabase client is provided
+                # Persist in the background if a supabase client is provided;
+                # the request only needs the in-memory user dict updated below.
+                # A failed write just means the token refreshes again next
+                # request, but it should leave a trace in the logs.
                 if supabase:
-                    supabase.table("users").update(update_data).eq(
-                        "id", user["id"]
-                    ).execute()
+                    future = _token_write_executor.submit(
+                        lambda: supabase.table("users")
+                        .update(update_data)
+                        .eq("id", user["id"])
+                        .execute()
+                    )
+                    future.add_done_callback(
+                        lambda f: print(
+                            f"Failed to persist refreshed Spotify token: {f.exception()}"
+                        )
+                        if f.exception()
+                        else None
+                    )
 
                 # Update the user dict for this request
                 user["spotify_access_token"] = token_info["access_token"]
@@ -90,7 +239,34 @@ def get_user_spotify_client(
                     detail=f"Failed to refresh Spotify token: {str(e)}. Please reconnect.",
                 )
 
-    return spotipy.Spotify(auth=user["spotify_access_token"])
+    token = user["spotify_access_token"]
+    with _sp_clients_lock:
+        client = _SP_CLIENTS.get(token)
+        if client is None:
+            client = spotipy.Spotify(auth=token, requests_session=_SPOTIFY_SESSION)
+            _SP_CLIENTS[token] = client
+    return client
+
+
+def _track_from_spotify(item: dict) -> SpotifyTrack:
+    """Build a SpotifyTrack from a Spotify API track object.
+
+    Shared by search, track, currently-playing and top-tracks so the
+    album/images/artists lookups happen exactly once per item.
+    """
+    album = item.get("album") or {}
+    images = album.get("images")
+    artists = item.get("artists") or ()
+    return SpotifyTrack.model_construct(
+        id=item.get("id", ""),
+        name=item.get("name", ""),
+        artist=", ".join(artist["name"] for artist in artists),
+        album=album.get("name", ""),
+        album_art_url=images[0].get("url") if images else None,
+        preview_url=item.get("preview_url"),
+        duration_ms=item.get("duration_ms", 0),
+        uri=item.get("uri", ""),
+    )
 
 
 @router.get("/connect", response_model=SpotifyAuthResponse)
@@ -114,7 +290,9 @@ async def spotify_callback(
     sp_oauth = get_spotify_oauth()
 
     try:
-        token_info = sp_oauth.get_access_token(code, check_cache=False)
+        token_info = await run_in_threadpool(
+            sp_oauth.get_access_token, code, check_cache=False
+        )
     except Exception as e:
         return HTMLResponse(
             content=f"""
@@ -160,11 +338,39 @@ async def spotify_callback(
             status_code=400,
         )
 
-    # Get Spotify user info
-    sp = spotipy.Spotify(auth=token_info["access_token"])
-    try:
-        spotify_user = sp.current_user()
-    except Exception as e:
+    # Get Spotify user info and persist the tokens concurrently - the
+    # update is keyed by state and doesn't need the profile response
+    sp = spotipy.Spotify(
+        auth=token_info["access_token"], requests_session=_SPOTIFY_SESSION
+    )
+
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=token_info["expires_in"]
+    )
+
+    # Update user with Spotify tokens using state (user_id)
+    update_data = {
+        "spotify_access_token": token_info["access_token"],
+        "spotify_refresh_token": token_info["refresh_token"],
+        "spotify_token_expires_at": expires_at.isoformat(),
+    }
+
+    spotify_user, result = await asyncio.gather(
+        run_in_threadpool(sp.current_user),
+        run_in_threadpool(
+            lambda: supabase.table("users")
+            .update(update_data)
+            .eq("id", state)
+            .execute()
+        ),
+        return_exceptions=True,
+    )
+
+    if isinstance(result, BaseException):
+        raise result
+
+    if isinstance(spotify_user, BaseException):
+        e = spotify_user
         return HTMLResponse(
             content=f"""
             <!DOCTYPE html>
@@ -209,19 +415,6 @@ async def spotify_callback(
             status_code=500,
         )
 
-    expires_at = datetime.now(timezone.utc) + timedelta(
-        seconds=token_info["expires_in"]
-    )
-
-    # Update user with Spotify tokens using state (user_id)
-    update_data = {
-        "spotify_access_token": token_info["access_token"],
-        "spotify_refresh_token": token_info["refresh_token"],
-        "spotify_token_expires_at": expires_at.isoformat(),
-    }
-
-    result = supabase.table("users").update(update_data).eq("id", state).execute()
-
     if not result.data:
         return HTMLResponse(
             content="""
@@ -321,7 +514,9 @@ async def get_spotify_status(current_user: dict = Depends(get_current_user)):
     )
 
 
-@router.get("/search", response_model=SpotifySearchResponse)
+# response documented via responses= so the direct PydanticORJSONResponse
+# return skips serialize_response entirely
+@router.get("/search", responses={200: {"model": SpotifySearchResponse}})
 async def search_tracks(
     q: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(20, ge=1, le=50),
@@ -329,45 +524,39 @@ async def search_tracks(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Search for tracks on Spotify."""
-    sp_client = get_user_spotify_client(current_user, supabase)
-
-    try:
-        results = sp_client.search(q=q, type="track", limit=limit)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Spotify API error: {str(e)}",
+    cache_key = (current_user["id"], q, limit)
+    cached = _SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return PydanticORJSONResponse(cached)
+
+    async with _response_lock(("search", *cache_key)):
+        cached = _SEARCH_CACHE.get(cache_key)
+        if cached is not None:
+            return PydanticORJSONResponse(cached)
+
+        sp_client = await run_in_threadpool(
+            get_user_spotify_client, current_user, supabase
         )
 
-    if not results or "tracks" not in results or "items" not in results["tracks"]:
-        return SpotifySearchResponse(tracks=[])
-
-    tracks = []
-    for item in results["tracks"]["items"]:
-        artists_list = item.get("artists", [])
-        artist_str = (
-            ", ".join([artist["name"] for artist in artists_list])
-            if artists_list
-            else ""
-        )
+        try:
+            async with _user_semaphore(current_user["id"]):
+                results = await run_in_threadpool(
+                    sp_client.search, q=q, type="track", limit=limit
+                )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Spotify API error: {str(e)}",
+            )
 
-        track = SpotifyTrack(
-            id=item.get("id", ""),
-            name=item.get("name", ""),
-            artist=artist_str,  # Changed from artists list to single string
-            album=item.get("album", {}).get("name", ""),
-            album_art_url=(  # Changed from album_art to album_art_url
-                item.get("album", {}).get("images", [{}])[0].get("url")
-                if item.get("album", {}).get("images")
-                else None
-            ),
-            preview_url=item.get("preview_url"),
-            duration_ms=item.get("duration_ms", 0),
-            uri=item.get("uri", ""),
-        )
-        tracks.append(track)
+        if not results or "tracks" not in results or "items" not in results["tracks"]:
+            response = SpotifySearchResponse(tracks=[])
+        else:
+            tracks = [_track_from_spotify(item) for item in results["tracks"]["items"]]
+            response = SpotifySearchResponse.model_construct(tracks=tracks)
 
-    return SpotifySearchResponse(tracks=tracks)
+        _SEARCH_CACHE[cache_key] = response
+        return PydanticORJSONResponse(response)
 
 
 @router.get("/track/{track_id}", response_model=SpotifyTrack)
@@ -377,10 +566,11 @@ async def get_track(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Get track details by ID."""
-    sp_client = get_user_spotify_client(current_user, supabase)
+    sp_client = await run_in_threadpool(get_user_spotify_client, current_user, supabase)
 
     try:
-        item = sp_client.track(track_id)
+        async with _user_semaphore(current_user["id"]):
+            item = await run_in_threadpool(sp_client.track, track_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Track not found: {str(e)}"
@@ -391,61 +581,60 @@ async def get_track(
             status_code=status.HTTP_404_NOT_FOUND, detail="Track not found"
         )
 
-    artists_list = item.get("artists", [])
-    artist_str = (
-        ", ".join([artist["name"] for artist in artists_list]) if artists_list else ""
-    )
-
-    return SpotifyTrack(
-        id=item["id"],
-        name=item["name"],
-        artist=artist_str,  # Changed from artists list to single string
-        album=item.get("album", {}).get("name", ""),
-        album_art_url=(  # Changed from album_art to album_art_url
-            item.get("album", {}).get("images", [{}])[0].get("url")
-            if item.get("album", {}).get("images")
-            else None
-        ),
-        preview_url=item.get("preview_url"),
-        duration_ms=item.get("duration_ms", 0),
-        uri=item.get("uri", ""),
-    )
+    return _track_from_spotify(item)
 
 
-@router.get("/playlists", response_model=List[SpotifyPlaylist])
+@router.get("/playlists", responses={200: {"model": List[SpotifyPlaylist]}})
 async def get_user_playlists(
+    request: Request,
     limit: int = Query(20, ge=1, le=50),
     current_user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase_client),
 ):
     """Get user's Spotify playlists."""
-    sp_client = get_user_spotify_client(current_user, supabase)
-
-    try:
-        results = sp_client.current_user_playlists(limit=limit)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Spotify API error: {str(e)}",
+    cache_key = (current_user["id"], limit)
+    cached = _PLAYLISTS_CACHE.get(cache_key)
+    if cached is not None:
+        return _etag_response(request, cached, max_age=300)
+
+    async with _response_lock(("playlists", *cache_key)):
+        cached = _PLAYLISTS_CACHE.get(cache_key)
+        if cached is not None:
+            return _etag_response(request, cached, max_age=300)
+
+        sp_client = await run_in_threadpool(
+            get_user_spotify_client, current_user, supabase
         )
 
-    if not results or "items" not in results:
-        return []
-
-    playlists = []
-    for item in results["items"]:
-        playlist = SpotifyPlaylist(
-            id=item["id"],
-            name=item["name"],
-            description=item.get("description"),
-            image=(
-                item.get("images", [{}])[0].get("url") if item.get("images") else None
-            ),
-            tracks_total=item.get("tracks", {}).get("total", 0),
-        )
-        playlists.append(playlist)
+        try:
+            async with _user_semaphore(current_user["id"]):
+                results = await run_in_threadpool(
+                    sp_client.current_user_playlists, limit=limit
+                )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Spotify API error: {str(e)}",
+            )
+
+        playlists = []
+        if results and "items" in results:
+            for item in results["items"]:
+                playlist = SpotifyPlaylist.model_construct(
+                    id=item["id"],
+                    name=item["name"],
+                    description=item.get("description"),
+                    image=(
+                        item.get("images", [{}])[0].get("url")
+                        if item.get("images")
+                        else None
+                    ),
+                    tracks_total=item.get("tracks", {}).get("total", 0),
+                )
+                playlists.append(playlist)
 
-    return playlists
+        _PLAYLISTS_CACHE[cache_key] = playlists
+        return _etag_response(request, playlists, max_age=300)
 
 
 @router.get("/currently-playing", response_model=CurrentlyPlaying)
@@ -454,10 +643,11 @@ async def get_currently_playing(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Get user's currently playing track."""
-    sp_client = get_user_spotify_client(current_user, supabase)
+    sp_client = await run_in_threadpool(get_user_spotify_client, current_user, supabase)
 
     try:
-        current = sp_client.current_playback()
+        async with _user_semaphore(current_user["id"]):
+            current = await run_in_threadpool(sp_client.current_playback)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -471,25 +661,7 @@ async def get_currently_playing(
     if not item:
         return CurrentlyPlaying(is_playing=False)
 
-    artists_list = item.get("artists", [])
-    artist_str = (
-        ", ".join([artist["name"] for artist in artists_list]) if artists_list else ""
-    )
-
-    track = SpotifyTrack(
-        id=item.get("id", ""),
-        name=item.get("name", ""),
-        artist=artist_str,
-        album=item.get("album", {}).get("name", ""),
-        album_art_url=(
-            item.get("album", {}).get("images", [{}])[0].get("url")
-            if item.get("album", {}).get("images")
-            else None
-        ),
-        preview_url=item.get("preview_url"),
-        duration_ms=item.get("duration_ms", 0),
-        uri=item.get("uri", ""),
-    )
+    track = _track_from_spotify(item)
 
     return CurrentlyPlaying(
         track=track,
@@ -498,11 +670,12 @@ async def get_currently_playing(
     )
 
 
-@router.get("/top-tracks", response_model=SpotifySearchResponse)
+@router.get("/top-tracks", responses={200: {"model": SpotifySearchResponse}})
 async def get_top_tracks(
+    request: Request,
     limit: int = Query(20, ge=1, le=50),
-    time_range: str = Query(
-        "medium_term", regex="^(short_term|medium_term|long_term)$"
+    time_range: Literal["short_term", "medium_term", "long_term"] = Query(
+        "medium_term"
     ),
     current_user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase_client),
@@ -511,42 +684,36 @@ async def get_top_tracks(
     Get user's top tracks.
     time_range: short_term (4 weeks), medium_term (6 months), long_term (years)
     """
-    sp_client = get_user_spotify_client(current_user, supabase)
-
-    try:
-        results = sp_client.current_user_top_tracks(limit=limit, time_range=time_range)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Spotify API error: {str(e)}",
-        )
-
-    if not results or "items" not in results:
-        return SpotifySearchResponse(tracks=[])
-
-    tracks = []
-    for item in results["items"]:
-        artists_list = item.get("artists", [])
-        artist_str = (
-            ", ".join([artist["name"] for artist in artists_list])
-            if artists_list
-            else ""
-        )
-
-        track = SpotifyTrack(
-            id=item.get("id", ""),
-            name=item.get("name", ""),
-            artist=artist_str,
-            album=item.get("album", {}).get("name", ""),
-            album_art_url=(
-                item.get("album", {}).get("images", [{}])[0].get("url")
-                if item.get("album", {}).get("images")
-                else None
-            ),
-            preview_url=item.get("preview_url"),
-            duration_ms=item.get("duration_ms", 0),
-            uri=item.get("uri", ""),
+    cache_key = (current_user["id"], limit, time_range)
+    cached = _TOP_TRACKS_CACHE.get(cache_key)
+    if cached is not None:
+        return _etag_response(request, cached, max_age=3600)
+
+    async with _response_lock(("top-tracks", *cache_key)):
+        cached = _TOP_TRACKS_CACHE.get(cache_key)
+        if cached is not None:
+            return _etag_response(request, cached, max_age=3600)
+
+        sp_client = await run_in_threadpool(
+            get_user_spotify_client, current_user, supabase
         )
-        tracks.append(track)
 
-    return SpotifySearchResponse(tracks=tracks)
+        try:
+            async with _user_semaphore(current_user["id"]):
+                results = await run_in_threadpool(
+                    sp_client.current_user_top_tracks, limit=limit, time_range=time_range
+                )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Spotify API error: {str(e)}",
+            )
+
+        if not results or "items" not in results:
+            response = SpotifySearchResponse(tracks=[])
+        else:
+            tracks = [_track_from_spotify(item) for item in results["items"]]
+            response = SpotifySearchResponse.model_construct(tracks=tracks)
+
+        _TOP_TRACKS_CACHE[cache_key] = response
+        return _etag_response(request, response, max_age=3600)
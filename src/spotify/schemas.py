@@ -7,10 +7,6 @@ class SpotifyAuthResponse(BaseModel):
     auth_url: str
 
 
-class SpotifyCallbackRequest(BaseModel):
-    code: str
-
-
 class SpotifyConnectionStatus(BaseModel):
     connected: bool
     spotify_user_id: Optional[str] = None
@@ -19,9 +15,9 @@ class SpotifyConnectionStatus(BaseModel):
 class SpotifyTrack(BaseModel):
     id: str
     name: str
-    artist: str  # Changed from artists: List[str] to match frontend
+    artist: str  # single comma-joined string, matching the frontend contract
     album: str
-    album_art_url: Optional[str] = None  # Changed from album_art to match frontend
+    album_art_url: Optional[str] = None
     preview_url: Optional[str] = None
     duration_ms: int
     uri: str
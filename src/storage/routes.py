@@ -1,8 +1,12 @@
+import asyncio
+import hashlib
 import io
-import uuid
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
 from supabase._sync.client import SyncClient as Client
 
@@ -16,6 +20,24 @@ router = APIRouter(prefix="/storage", tags=["Storage"])
 
 ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Bounded pool for CPU-heavy image work so uploads don't stall the event loop
+_IMG_POOL = ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix="storage-image"
+)
+
+
+def warm_image_codecs() -> None:
+    """Run a tiny encode/decode so the first real upload skips codec setup.
+
+    PIL builds its JPEG Huffman tables and resampling LUTs lazily; on a fresh
+    worker that cost lands on the first upload's latency.
+    """
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="JPEG", quality=85, optimize=True)
+    buf.seek(0)
+    Image.open(buf).load()
 
 
 def validate_image(file: UploadFile) -> None:
@@ -31,17 +53,36 @@ def optimize_image(image_bytes: bytes, max_width: int = 1200) -> bytes:
     """Optimize image by resizing and compressing."""
     img = Image.open(io.BytesIO(image_bytes))
 
+    # Already a small-enough baseline JPEG: skip the decode/re-encode pass
+    # entirely. Image.open only parses the header, so this check is free.
+    # The copy matters: callers may pass a bytearray, which the storage
+    # client refuses to upload.
+    if img.format == "JPEG" and img.width <= max_width and img.mode in ("RGB", "L"):
+        return bytes(image_bytes)
+
+    # For JPEGs, let libjpeg DCT-scale by 1/2, 1/4 or 1/8 during decode so
+    # a 10MB camera shot never materializes at full resolution; the LANCZOS
+    # finish below still runs, so output quality is unchanged. No-op for
+    # other formats. Height 1 keeps the height ratio non-constraining:
+    # draft() picks min(width//req_w, height//req_h), so a large requested
+    # height would force scale 1 and disable the prescale entirely.
+    img.draft("RGB", (max_width, 1))
+
     # Convert RGBA to RGB if necessary
     if img.mode == "RGBA":
         background = Image.new("RGB", img.size, "white")  # type: ignore
         background.paste(img, mask=img.split()[3])
         img = background
 
-    # Resize if too large
+    # Resize if too large. reducing_gap lets Pillow do a cheap box reduce
+    # first and only run the LANCZOS kernel near the target size, which is
+    # several times faster on large camera uploads
     if img.width > max_width:
         ratio = max_width / img.width
         new_height = int(img.height * ratio)
-        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+        img = img.resize(
+            (max_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0
+        )
 
     # Save optimized image
     output = io.BytesIO()
@@ -51,6 +92,7 @@ def optimize_image(image_bytes: bytes, max_width: int = 1200) -> bytes:
 
 @router.post("/upload/image", response_model=UploadResponse)
 async def upload_image(
+    request: Request,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase_client),
@@ -58,38 +100,65 @@ async def upload_image(
     """Upload an image file to Supabase storage."""
     validate_image(file)
 
-    # Read file
-    file_bytes = await file.read()
-
-    if len(file_bytes) > MAX_IMAGE_SIZE:
+    # Reject declared-oversized uploads before consuming any of the body.
+    # The chunked reader below still enforces the cap when Content-Length
+    # is absent (chunked transfer) or lies.
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > MAX_IMAGE_SIZE:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"Image too large. Maximum size: {MAX_IMAGE_SIZE / 1024 / 1024}MB",
         )
 
-    # Optimize image
+    # Read the body in chunks, enforcing the size cap incrementally so an
+    # oversized upload is rejected as soon as it crosses the limit
+    file_bytes = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        file_bytes.extend(chunk)
+        if len(file_bytes) > MAX_IMAGE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image too large. Maximum size: {MAX_IMAGE_SIZE / 1024 / 1024}MB",
+            )
+
+    # Optimize image off the event loop; PIL decode/resize/encode is CPU-bound
     try:
-        optimized_bytes = optimize_image(file_bytes)
+        optimized_bytes = await asyncio.get_running_loop().run_in_executor(
+            _IMG_POOL, optimize_image, file_bytes
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to process image: {str(e)}",
         )
 
-    # Generate unique filename
+    # Content-addressed filename: re-uploads of the same image map to the
+    # same object, so duplicates are deduplicated by the storage layer
     file_ext = Path(file.filename or "image.jpg").suffix or ".jpg"
-    file_name = f"{current_user['id']}/{uuid.uuid4()}{file_ext}"
+    content_hash = hashlib.sha256(optimized_bytes).hexdigest()
+    file_name = f"{current_user['id']}/{content_hash}{file_ext}"
 
-    # Upload to Supabase storage
+    # Upload to Supabase storage; the sync client blocks, so run it in the
+    # shared threadpool
     try:
-        supabase.storage.from_(settings.SUPABASE_STORAGE_BUCKET_IMAGES).upload(
-            file_name, optimized_bytes, {"contentType": "image/jpeg"}  # type: ignore
+        await run_in_threadpool(
+            lambda: supabase.storage.from_(
+                settings.SUPABASE_STORAGE_BUCKET_IMAGES
+            ).upload(
+                file_name, optimized_bytes, {"contentType": "image/jpeg"}  # type: ignore
+            )
         )
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to upload image: {str(e)}",
-        )
+        # storage3 raises with the API's JSON error payload as the first
+        # argument; only an actual 409 means this exact image already exists
+        # under its content hash and the existing object can be served
+        error = e.args[0] if e.args else None
+        status_code = error.get("statusCode") if isinstance(error, dict) else None
+        if str(status_code) != "409":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to upload image: {str(e)}",
+            )
 
     # Get public URL
     file_url = supabase.storage.from_(
@@ -109,23 +178,24 @@ async def delete_file(
     current_user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase_client),
 ):
-    """Delete an image file from storage."""
-    # Check if file belongs to user
-    if not delete_data.file_path.startswith(f"{current_user['id']}/"):
+    """Delete image files from storage."""
+    # Check that every file belongs to the user before deleting anything
+    prefix = f"{current_user['id']}/"
+    if any(not path.startswith(prefix) for path in delete_data.file_paths):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to delete this file",
+            detail="You don't have permission to delete these files",
         )
 
-    # Delete from images bucket
+    # Delete from images bucket; remove() takes the whole batch in one call
     try:
         supabase.storage.from_(settings.SUPABASE_STORAGE_BUCKET_IMAGES).remove(
-            [delete_data.file_path]
+            delete_data.file_paths
         )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete file: {str(e)}",
+            detail=f"Failed to delete files: {str(e)}",
         )
 
     return None
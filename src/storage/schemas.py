@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import List
+
+from pydantic import BaseModel, Field
 
 
 class UploadResponse(BaseModel):
@@ -8,4 +10,4 @@ class UploadResponse(BaseModel):
 
 
 class DeleteRequest(BaseModel):
-    file_path: str
+    file_paths: List[str] = Field(..., min_length=1, max_length=100)
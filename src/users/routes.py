@@ -1,66 +1,63 @@
+import threading
 from typing import List, Optional
 
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import TypeAdapter
 from supabase._sync.client import SyncClient as Client
 
 from src.middleware import (
     get_current_user,
     get_optional_current_user,
     get_supabase_client,
+    invalidate_user_cache,
 )
 
 from .schemas import FollowResponse, UserProfile, UserProfileUpdate, UserSearchResult
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Validates a whole page of rows in one adapter call instead of
+# constructing UserSearchResult(**row) per row
+_user_search_list_adapter = TypeAdapter(List[UserSearchResult])
 
-def get_user_stats(user_id: str, supabase: Client) -> dict:
-    """Get user statistics (followers, following, posts count)."""
-    # Get followers count
-    followers = (
-        supabase.table("follows")
-        .select("id", count="exact")  # type: ignore
-        .eq("following_id", user_id)
-        .execute()
-    )
+# Short-TTL cache for the read-hot profile page, keyed per viewer so
+# is_following stays correct. Write paths invalidate the affected usernames.
+_PROFILE_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=30)
+_profile_cache_lock = threading.Lock()
 
-    # Get following count
-    following = (
-        supabase.table("follows")
-        .select("id", count="exact")  # type: ignore
-        .eq("follower_id", user_id)
-        .execute()
-    )
 
-    # Get posts count
-    posts = (
-        supabase.table("posts")
-        .select("id", count="exact")  # type: ignore
-        .eq("user_id", user_id)
-        .execute()
-    )
+def invalidate_profile_cache(username: str) -> None:
+    """Drop every cached profile view for a username, across all viewers."""
+    with _profile_cache_lock:
+        for key in [k for k in _PROFILE_CACHE if k[0] == username]:
+            del _PROFILE_CACHE[key]
 
-    return {
-        "followers_count": followers.count or 0,
-        "following_count": following.count or 0,
-        "posts_count": posts.count or 0,
-    }
 
+def get_user_stats(user_id: str, supabase: Client) -> dict:
+    """Get user statistics (followers, following, posts count)."""
+    # One round-trip: the get_user_stats function (migration 007) computes
+    # all three counts inside Postgres
+    result = supabase.rpc("get_user_stats", {"uid": user_id}).execute()
+    return result.data
 
-def check_if_following(follower_id: str, following_id: str, supabase: Client) -> bool:
-    """Check if follower_id is following following_id."""
-    if not follower_id:
-        return False
+
+def get_following_set(
+    follower_id: Optional[str], user_ids: List[str], supabase: Client
+) -> set:
+    """Return the subset of user_ids that follower_id follows, in one query."""
+    if not follower_id or not user_ids:
+        return set()
 
     result = (
         supabase.table("follows")
-        .select("id")
+        .select("following_id")
         .eq("follower_id", follower_id)
-        .eq("following_id", following_id)
+        .in_("following_id", user_ids)
         .execute()
     )
 
-    return len(result.data) > 0
+    return {row["following_id"] for row in result.data}
 
 
 @router.get("/search", response_model=List[UserSearchResult])
@@ -71,30 +68,24 @@ async def search_users(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Search for users by username or display name."""
-    search_query = f"%{q}%"
+    # The search_users function (migration 010) runs the substring match
+    # against the trigram indexes and ranks by similarity
+    users = supabase.rpc("search_users", {"q": q, "lim": limit}).execute()
 
-    # Search users
-    users = (
-        supabase.table("users")
-        .select("id, username, display_name, profile_image_url")
-        .or_(f"username.ilike.{search_query},display_name.ilike.{search_query}")
-        .limit(limit)
-        .execute()
-    )
-
-    # Add is_following status
-    results = []
+    # Anonymous viewers follow nobody: validate the raw rows in one shot
+    # (is_following defaults to False) without the per-row dict rebuild
     current_user_id = current_user["id"] if current_user else None
+    if current_user_id is None:
+        return _user_search_list_adapter.validate_python(users.data)
 
-    for user in users.data:
-        is_following = (
-            check_if_following(current_user_id, user["id"], supabase)
-            if current_user_id
-            else False
-        )
-        results.append(UserSearchResult(**user, is_following=is_following))
+    # Add is_following status with one batched query instead of one per row
+    followed = get_following_set(
+        current_user_id, [user["id"] for user in users.data], supabase
+    )
 
-    return results
+    return _user_search_list_adapter.validate_python(
+        [{**user, "is_following": user["id"] in followed} for user in users.data]
+    )
 
 
 @router.get("/{username}", response_model=UserProfile)
@@ -104,36 +95,34 @@ async def get_user_profile(
     supabase: Client = Depends(get_supabase_client),
 ):
     """Get user profile by username."""
-    # Get user
-    user = (
-        supabase.table("users")
-        .select(
-            "id, username, display_name, profile_image_url, bio, spotify_access_token, created_at"
-        )
-        .eq("username", username)
-        .single()
-        .execute()
-    )
+    viewer_id = current_user["id"] if current_user else None
+    cache_key = (username, viewer_id or "anon")
+
+    with _profile_cache_lock:
+        cached = _PROFILE_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # One round-trip: the get_user_profile_full function (migration 008)
+    # joins the user row, the three counts and the follow check, and keeps
+    # the Spotify token inside Postgres
+    result = supabase.rpc(
+        "get_user_profile_full",
+        {
+            "uname": username,
+            "viewer_id": viewer_id,
+        },
+    ).execute()
 
-    if not user.data:
+    if not result.data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    user_data = user.data
-    # Derive spotify_connected from whether spotify_access_token exists
-    user_data["spotify_connected"] = bool(user_data.get("spotify_access_token"))
-    # Remove the token from response for security
-    user_data.pop("spotify_access_token", None)
-
-    stats = get_user_stats(user_data["id"], supabase)
-
-    # Check if current user is following this user
-    is_following = False
-    if current_user and current_user["id"] != user_data["id"]:
-        is_following = check_if_following(current_user["id"], user_data["id"], supabase)
-
-    return UserProfile(**user_data, **stats, is_following=is_following)
+    profile = UserProfile(**result.data)
+    with _profile_cache_lock:
+        _PROFILE_CACHE[cache_key] = profile
+    return profile
 
 
 @router.patch("/me", response_model=UserProfile)
@@ -182,6 +171,11 @@ async def update_profile(
         )
 
     user_data = updated_user.data[0]
+    # Drop cached copies of the old row so subsequent requests see the update
+    invalidate_user_cache(user_data["id"])
+    invalidate_profile_cache(current_user["username"])
+    if user_data["username"] != current_user["username"]:
+        invalidate_profile_cache(user_data["username"])
     stats = get_user_stats(user_data["id"], supabase)
 
     return UserProfile(**user_data, **stats, is_following=False)
@@ -212,25 +206,22 @@ async def follow_user(
             status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot follow yourself"
         )
 
-    # Check if already following
-    existing_follow = (
-        supabase.table("follows")
-        .select("id")
-        .eq("follower_id", current_user["id"])
-        .eq("following_id", target_user_id)
-        .execute()
-    )
+    # One round-trip: the follow_user function (migration 009) applies the
+    # insert (idempotently, via the unique constraint) and returns the new
+    # followers count
+    result = supabase.rpc(
+        "follow_user", {"me": current_user["id"], "target": target_user_id}
+    ).execute()
 
-    if existing_follow.data:
+    if not result.data["created"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Already following this user",
         )
 
-    # Create follow
-    supabase.table("follows").insert(
-        {"follower_id": current_user["id"], "following_id": target_user_id}
-    ).execute()
+    # The target's followers_count and the viewer's following_count changed
+    invalidate_profile_cache(username)
+    invalidate_profile_cache(current_user["username"])
 
     # Create notification for the followed user
     # Store only follower_id - we'll fetch current username/display_name when displaying
@@ -246,16 +237,10 @@ async def follow_user(
         }
     ).execute()
 
-    # Get updated followers count
-    followers = (
-        supabase.table("follows")
-        .select("id", count="exact")  # type: ignore
-        .eq("following_id", target_user_id)
-        .execute()
+    return FollowResponse(
+        is_following=True, followers_count=result.data["followers_count"]
     )
 
-    return FollowResponse(is_following=True, followers_count=followers.count or 0)
-
 
 @router.delete("/{username}/follow", response_model=FollowResponse)
 async def unfollow_user(
@@ -276,30 +261,25 @@ async def unfollow_user(
 
     target_user_id = target_user.data["id"]
 
-    # Delete follow
-    result = (
-        supabase.table("follows")
-        .delete()
-        .eq("follower_id", current_user["id"])
-        .eq("following_id", target_user_id)
-        .execute()
-    )
+    # One round-trip: the unfollow_user function (migration 009) applies the
+    # delete and returns the new followers count
+    result = supabase.rpc(
+        "unfollow_user", {"me": current_user["id"], "target": target_user_id}
+    ).execute()
 
-    if not result.data:
+    if not result.data["deleted"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You are not following this user",
         )
 
-    # Get updated followers count
-    followers = (
-        supabase.table("follows")
-        .select("id", count="exact")  # type: ignore
-        .eq("following_id", target_user_id)
-        .execute()
-    )
+    # The target's followers_count and the viewer's following_count changed
+    invalidate_profile_cache(username)
+    invalidate_profile_cache(current_user["username"])
 
-    return FollowResponse(is_following=False, followers_count=followers.count or 0)
+    return FollowResponse(
+        is_following=False, followers_count=result.data["followers_count"]
+    )
 
 
 @router.get("/{username}/followers", response_model=List[UserSearchResult])
@@ -321,29 +301,19 @@ async def get_followers(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    # Get followers with user info
-    followers = (
-        supabase.table("follows")
-        .select("follower:follower_id(id, username, display_name, profile_image_url)")
-        .eq("following_id", user.data["id"])
-        .range(offset, offset + limit - 1)
-        .execute()
-    )
-
-    # Format results
-    results = []
-    current_user_id = current_user["id"] if current_user else None
-
-    for follow in followers.data:
-        follower = follow["follower"]
-        is_following = (
-            check_if_following(current_user_id, follower["id"], supabase)
-            if current_user_id
-            else False
-        )
-        results.append(UserSearchResult(**follower, is_following=is_following))
+    # One round-trip: the list_followers function (migration 011) joins the
+    # page of users and computes the viewer's follow status inline
+    followers = supabase.rpc(
+        "list_followers",
+        {
+            "target": user.data["id"],
+            "viewer": current_user["id"] if current_user else None,
+            "lim": limit,
+            "off": offset,
+        },
+    ).execute()
 
-    return results
+    return _user_search_list_adapter.validate_python(followers.data)
 
 
 @router.get("/{username}/following", response_model=List[UserSearchResult])
@@ -365,26 +335,16 @@ async def get_following(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    # Get following with user info
-    following = (
-        supabase.table("follows")
-        .select("following:following_id(id, username, display_name, profile_image_url)")
-        .eq("follower_id", user.data["id"])
-        .range(offset, offset + limit - 1)
-        .execute()
-    )
-
-    # Format results
-    results = []
-    current_user_id = current_user["id"] if current_user else None
-
-    for follow in following.data:
-        following_user = follow["following"]
-        is_following = (
-            check_if_following(current_user_id, following_user["id"], supabase)
-            if current_user_id
-            else False
-        )
-        results.append(UserSearchResult(**following_user, is_following=is_following))
+    # One round-trip: the list_following function (migration 011) joins the
+    # page of users and computes the viewer's follow status inline
+    following = supabase.rpc(
+        "list_following",
+        {
+            "target": user.data["id"],
+            "viewer": current_user["id"] if current_user else None,
+            "lim": limit,
+            "off": offset,
+        },
+    ).execute()
 
-    return results
+    return _user_search_list_adapter.validate_python(following.data)
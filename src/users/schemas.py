@@ -1,7 +1,12 @@
+import re
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+# Lowercase letter first, then lowercase letters, numbers, _ or -; length is
+# enforced by the Field constraints
+_USERNAME_RE = re.compile(r"[a-z][a-z0-9_-]*")
 
 
 class UserProfileUpdate(BaseModel):
@@ -16,17 +21,11 @@ class UserProfileUpdate(BaseModel):
         if v is None:
             return v
 
-        # Check if username contains only lowercase letters, numbers, and underscores
-        if not v.replace("_", "").replace("-", "").isalnum():
-            raise ValueError("Username can only contain lowercase letters, numbers, underscores, and hyphens")
-
-        # Check if username contains uppercase letters
-        if v != v.lower():
-            raise ValueError("Username must be lowercase")
-
-        # Check if username starts with a letter
-        if not v[0].isalpha():
-            raise ValueError("Username must start with a letter")
+        if not _USERNAME_RE.fullmatch(v):
+            raise ValueError(
+                "Username must start with a lowercase letter and can only contain "
+                "lowercase letters, numbers, underscores, and hyphens"
+            )
 
         return v
 
@@ -44,8 +43,7 @@ class UserProfile(BaseModel):
     is_following: bool = False
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class FollowResponse(BaseModel):
@@ -60,5 +58,4 @@ class UserSearchResult(BaseModel):
     profile_image_url: Optional[str] = None
     is_following: bool = False
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
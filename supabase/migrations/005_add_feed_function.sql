@@ -0,0 +1,25 @@
+-- Create function to fetch the personalized feed in a single round-trip.
+-- Replaces the follows lookup + posts query pair the API used to issue,
+-- and joins the author inline so no follow-up user queries are needed.
+CREATE OR REPLACE FUNCTION get_feed(uid UUID, lim INTEGER, off INTEGER)
+RETURNS SETOF JSONB AS $$
+    SELECT to_jsonb(p) || jsonb_build_object(
+        'user', jsonb_build_object(
+            'id', u.id,
+            'username', u.username,
+            'display_name', u.display_name,
+            'profile_image_url', u.profile_image_url
+        )
+    )
+    FROM posts p
+    JOIN users u ON u.id = p.user_id
+    WHERE p.is_expired = FALSE
+    AND (
+        p.user_id = uid
+        OR p.user_id IN (
+            SELECT following_id FROM follows WHERE follower_id = uid
+        )
+    )
+    ORDER BY p.created_at DESC
+    LIMIT lim OFFSET off;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,11 @@
+-- Partial index for the active-posts read path. Every feed/post read
+-- filters on is_expired = FALSE and orders by created_at DESC, so this
+-- turns those queries into an index scan instead of Seq Scan + Sort.
+CREATE INDEX IF NOT EXISTS idx_posts_active_created_at
+    ON posts (created_at DESC)
+    WHERE is_expired = FALSE;
+
+-- Same shape for per-user post listings (profile pages)
+CREATE INDEX IF NOT EXISTS idx_posts_active_user_created_at
+    ON posts (user_id, created_at DESC)
+    WHERE is_expired = FALSE;
@@ -0,0 +1,11 @@
+-- Create function to fetch profile stats in a single round-trip.
+-- Replaces the three count queries (followers, following, posts) the API
+-- used to issue serially for every profile fetch.
+CREATE OR REPLACE FUNCTION get_user_stats(uid UUID)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'followers_count', (SELECT count(*) FROM follows WHERE following_id = uid),
+        'following_count', (SELECT count(*) FROM follows WHERE follower_id = uid),
+        'posts_count', (SELECT count(*) FROM posts WHERE user_id = uid)
+    );
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,29 @@
+-- Create function to fetch a full user profile in a single round-trip.
+-- Replaces the user fetch + get_user_stats + follow check the API used to
+-- issue serially. The Spotify token never leaves Postgres: only the
+-- derived spotify_connected flag is returned.
+CREATE OR REPLACE FUNCTION get_user_profile_full(uname TEXT, viewer_id UUID)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'id', u.id,
+        'username', u.username,
+        'display_name', u.display_name,
+        'profile_image_url', u.profile_image_url,
+        'bio', u.bio,
+        'created_at', u.created_at,
+        'spotify_connected', COALESCE(u.spotify_access_token, '') <> '',
+        'followers_count', (SELECT count(*) FROM follows WHERE following_id = u.id),
+        'following_count', (SELECT count(*) FROM follows WHERE follower_id = u.id),
+        'posts_count', (SELECT count(*) FROM posts WHERE user_id = u.id),
+        'is_following', (
+            viewer_id IS NOT NULL
+            AND viewer_id <> u.id
+            AND EXISTS (
+                SELECT 1 FROM follows
+                WHERE follower_id = viewer_id AND following_id = u.id
+            )
+        )
+    )
+    FROM users u
+    WHERE u.username = uname;
+$$ LANGUAGE sql STABLE;
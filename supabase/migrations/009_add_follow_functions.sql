@@ -0,0 +1,35 @@
+-- Create functions that apply a follow/unfollow and return the target's new
+-- followers count in the same round-trip. Replaces the existence check,
+-- write and count='exact' re-query the API used to issue per follow action.
+CREATE OR REPLACE FUNCTION follow_user(me UUID, target UUID)
+RETURNS JSONB AS $$
+DECLARE
+    created BOOLEAN;
+BEGIN
+    INSERT INTO follows (follower_id, following_id)
+    VALUES (me, target)
+    ON CONFLICT (follower_id, following_id) DO NOTHING;
+    created := FOUND;
+
+    RETURN jsonb_build_object(
+        'created', created,
+        'followers_count', (SELECT count(*) FROM follows WHERE following_id = target)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION unfollow_user(me UUID, target UUID)
+RETURNS JSONB AS $$
+DECLARE
+    deleted BOOLEAN;
+BEGIN
+    DELETE FROM follows
+    WHERE follower_id = me AND following_id = target;
+    deleted := FOUND;
+
+    RETURN jsonb_build_object(
+        'deleted', deleted,
+        'followers_count', (SELECT count(*) FROM follows WHERE following_id = target)
+    );
+END;
+$$ LANGUAGE plpgsql;
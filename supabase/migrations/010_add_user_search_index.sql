@@ -0,0 +1,27 @@
+-- Trigram indexes for user search. The typeahead endpoint filters with a
+-- leading-wildcard ILIKE, which a btree can never serve; GIN trigram
+-- indexes support ILIKE '%q%' directly, turning the seq scan into an
+-- index scan.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm
+    ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_display_name_trgm
+    ON users USING gin (display_name gin_trgm_ops);
+
+-- Search function: keeps the existing substring-match semantics but ranks
+-- results by trigram similarity so the closest handles come back first.
+CREATE OR REPLACE FUNCTION search_users(q TEXT, lim INTEGER)
+RETURNS SETOF JSONB AS $$
+    SELECT jsonb_build_object(
+        'id', u.id,
+        'username', u.username,
+        'display_name', u.display_name,
+        'profile_image_url', u.profile_image_url
+    )
+    FROM users u
+    WHERE u.username ILIKE '%' || q || '%'
+       OR u.display_name ILIKE '%' || q || '%'
+    ORDER BY GREATEST(similarity(u.username, q), similarity(u.display_name, q)) DESC
+    LIMIT lim;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,46 @@
+-- Create functions that return a page of followers/following with the
+-- viewer's follow status computed inline. Replaces the embedded-join fetch
+-- plus the batched follow-status query the API used to issue, and lets the
+-- planner serve both the list and the EXISTS probes from the follows
+-- indexes.
+CREATE OR REPLACE FUNCTION list_followers(target UUID, viewer UUID, lim INTEGER, off INTEGER)
+RETURNS SETOF JSONB AS $$
+    SELECT jsonb_build_object(
+        'id', u.id,
+        'username', u.username,
+        'display_name', u.display_name,
+        'profile_image_url', u.profile_image_url,
+        'is_following', (
+            viewer IS NOT NULL AND EXISTS (
+                SELECT 1 FROM follows
+                WHERE follower_id = viewer AND following_id = u.id
+            )
+        )
+    )
+    FROM follows f
+    JOIN users u ON u.id = f.follower_id
+    WHERE f.following_id = target
+    ORDER BY f.created_at DESC
+    LIMIT lim OFFSET off;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION list_following(target UUID, viewer UUID, lim INTEGER, off INTEGER)
+RETURNS SETOF JSONB AS $$
+    SELECT jsonb_build_object(
+        'id', u.id,
+        'username', u.username,
+        'display_name', u.display_name,
+        'profile_image_url', u.profile_image_url,
+        'is_following', (
+            viewer IS NOT NULL AND EXISTS (
+                SELECT 1 FROM follows
+                WHERE follower_id = viewer AND following_id = u.id
+            )
+        )
+    )
+    FROM follows f
+    JOIN users u ON u.id = f.following_id
+    WHERE f.follower_id = target
+    ORDER BY f.created_at DESC
+    LIMIT lim OFFSET off;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,9 @@
+-- Create function to fetch the unread-notification count in one round-trip
+-- without transferring any rows. The head=True count the API briefly used
+-- doesn't work on the pinned postgrest client (0.18.x never parses the
+-- count from a bodyless response), so the count is computed here instead.
+CREATE OR REPLACE FUNCTION unread_count(uid UUID)
+RETURNS INTEGER AS $$
+    SELECT count(*)::INTEGER FROM notifications
+    WHERE user_id = uid AND is_read = FALSE;
+$$ LANGUAGE sql STABLE;